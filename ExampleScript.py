@@ -18,9 +18,10 @@ minmass = 200     # size of the particle (for trackpy)
 paths = spt.directory_setup(filename_startswith, get_dir, save_dir)
 for index, path in paths.iterrows():
     spt.create_folder(path['save'])
-    spt.test_locations(path, psize, minmass)
+    frames = spt.open_frames(path)
+    spt.test_locations(frames, path, psize, minmass)
 
-    frames, particles, trajectories = spt.locate_particles(path, exp_max, psize, minmass)
+    particles, trajectories = spt.locate_particles(frames, path, exp_max, psize, minmass)
     
     # remove = []
     # trajectories = spt.remove_trajectories(trajectories, remove, path)
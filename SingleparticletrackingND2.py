@@ -22,10 +22,9 @@ Created on Wed Sep 30 2020
  H. Mary, and A. Ahmadia, “soft-matter/trackpy:  Trackpy v0.4.2,” Oct. 2019.)
 """
 
-import seaborn as sns
 import numpy as np
 import pandas as pd
-import math
+from scipy.stats import gaussian_kde
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
@@ -33,6 +32,11 @@ import matplotlib.animation as animation
 import pims
 import trackpy as tp
 import os
+from joblib import Parallel, delayed
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def directory_setup(filename_startswith, get_dir, save_dir):
@@ -49,16 +53,9 @@ def directory_setup(filename_startswith, get_dir, save_dir):
     -------
     paths : Dataframe with all get and save locations   
     '''
-    paths_data = []
-    directory = os.fsencode(get_dir)
-        
-    for file in os.listdir(directory):
-         filename = os.fsdecode(file)
-         if filename.startswith(filename_startswith): 
-             paths_data.append([get_dir + filename, save_dir + filename + "\\"])
-             continue
-         else:
-             continue
+    paths_data = [[get_dir + entry.name, save_dir + entry.name + os.sep]
+                  for entry in os.scandir(get_dir)
+                  if entry.name.startswith(filename_startswith) and entry.is_file()]
     
     paths = pd.DataFrame(paths_data, columns=['get', 'save'])
     
@@ -80,6 +77,22 @@ def create_folder(path):
         print("Directory " , path ,  " already exists")  
 
 
+def open_frames(file_path):
+    '''Open the ND2 file. The frames are opened once and passed on to the 
+    analysis functions.
+
+    Parameters
+    ----------
+    file_path : Dataframe with single "save" and "get" paths.
+
+    Returns
+    -------
+    frames : pims.ND2
+    '''
+    frames = pims.ND2_Reader(file_path['get'])
+    return frames
+
+
 def get_dpi(frames):
     '''Get the dots per inch (dpi) from the ND2 metadata.
 
@@ -101,18 +114,29 @@ def get_dpi(frames):
     return dpi
 
 
-def locate_particles(file_path, exp_max, psize, minmass):
-    '''Read ND2 file, find particles in all video frames and link the particles
-    into trajectories.
+def _locate_frame(i, frame, psize, minmass):
+    '''Locate the particles in a single video frame for locate_particles().'''
+    return tp.locate(frame, psize, minmass=minmass, invert=True).assign(frame=i)
+
+
+def locate_particles(frames, file_path, exp_max, psize, minmass):
+    '''Find particles in all video frames and link the particles into 
+    trajectories.
 
     Parameters
     ----------
+    frames : pims.ND2, the opened ND2 file.
     file_path : Dataframe with single "save" and "get" paths.
     exp_max : Integer, expected maximum speed of a particle (nm/s). Particles 
         that are faster, will not be detected.
     psize : Integer, particle size. Has to be an odd number.
     minmass : Integer, Trackpy measure to identify particles.
 
+    Returns
+    -------
+    particles : Dataframe containing each particle location.
+    trajectories : Dataframe with all (filtered) trajectories.
+
     Notes
     -----
     The trajectories with a length below a certain threshold (5 frames) are 
@@ -120,39 +144,41 @@ def locate_particles(file_path, exp_max, psize, minmass):
     
     See also
     --------
+    open_frames()
     Trackpy for more information: 
     http://soft-matter.github.io/trackpy/v0.4.2/tutorial/walkthrough.html
     '''
-    # Open the frames from file location (nd2 file)
-    frames = pims.ND2_Reader(file_path['get'])
     mpp = frames.metadata['calibration_um']
     
-    # Find the particles
-    particles = tp.batch(frames, psize, minmass=minmass, invert=True)
+    # Find the particles, frames are located in parallel. pre_dispatch bounds 
+    # the number of frames that are read into memory at once.
+    parts = Parallel(n_jobs=-1, pre_dispatch='2*n_jobs')(
+        delayed(_locate_frame)(i, frames[i], psize, minmass) for i in range(len(frames)))
+    particles = pd.concat(parts, ignore_index=True)
     
     # Link particles into trajectories
     frame_rate = 1/frames.metadata['frame_rate']
     trajectories = tp.link(particles, exp_max/mpp*frame_rate, memory=3)
     
-    timesteps = []
-    for idx, trajectory in trajectories.iterrows():
-        timesteps.append(frames[int(trajectory["frame"])].metadata["t_ms"])
-    trajectories['time'] = timesteps
+    # Read the timestamp of each frame only once
+    timesteps = {frame: frames[int(frame)].metadata["t_ms"] for frame in trajectories['frame'].unique()}
+    trajectories['time'] = trajectories['frame'].map(timesteps).to_numpy()
     
     # Filter noise (particles with short tracks)
     filtered_trajectories = tp.filter_stubs(trajectories,5)
     print('Before:', trajectories['particle'].nunique())
     print('After:', filtered_trajectories['particle'].nunique())
-    filtered_trajectories.to_csv(file_path['save'] + "t1")
+    filtered_trajectories.reset_index(drop=True).to_parquet(file_path['save'] + "t1.parquet")
 
-    return(frames, particles, filtered_trajectories)
+    return(particles, filtered_trajectories)
 
     
-def test_locations(file_path, psize, minmass, frame = 0):
+def test_locations(frames, file_path, psize, minmass, frame = 0):
     '''Find particles in the first video frame. 
     
     Parameters
     ----------
+    frames : pims.ND2, the opened ND2 file.
     file_path : Dataframe with single "save" and "get" paths.
     psize : Integer, particle size. Has to be an odd number.
     minmass : Integer, Trackpy measure to identify particles.
@@ -174,7 +200,6 @@ def test_locations(file_path, psize, minmass, frame = 0):
     Trackpy for more information:
     http://soft-matter.github.io/trackpy/v0.4.2/tutorial/walkthrough.html
     '''
-    frames = pims.ND2_Reader(file_path['get'])
     dpi = get_dpi(frames)
     f = tp.locate(frames[frame], psize, minmass=minmass, invert=True)
     fig, ax = plt.subplots()
@@ -191,13 +216,49 @@ def test_locations(file_path, psize, minmass, frame = 0):
     plt.close('all')
 
 
-def save_video(fig, ims, name, path, writer):
-    ani = animation.ArtistAnimation(fig, ims, interval=50)
-    ani.save(path + name, writer=writer)
-    plt.close("all")    
+def save_video(images, name, path, writer):
+    '''Stream the images into a video file. A single image artist is reused 
+    and every frame is written directly, so the movie is never held in memory.'''
+    fig = plt.figure()
+    im = None
+    with writer.saving(fig, path + name, fig.dpi):
+        for image in images:
+            if im is None:
+                im = plt.imshow(image)
+            else:
+                im.set_data(image)
+                im.autoscale()
+            writer.grab_frame()
+    plt.close("all")
     return
 
 
+def marked_frames(frames, particles, width=2):
+    '''Yield the frames with a (blank) marker at every particle location 
+    found up to that frame.'''
+    # Particle locations (frame, x, y), cast to int32 once and sorted by frame
+    int_particles = particles[['frame', 'x', 'y']].to_numpy().astype(np.int32)
+    int_particles = int_particles[np.argsort(int_particles[:, 0], kind='stable')]
+    frame_no = int_particles[:, 0]
+    
+    # Pixel rows and columns of the marker window around every location
+    ox, oy = np.meshgrid(np.arange(-width, width), np.arange(-width, width))
+    rows = int_particles[:, 2][:, None, None] + oy
+    cols = int_particles[:, 1][:, None, None] + ox
+    
+    # Number of locations found up to each frame, the windows of a frame 
+    # are then the slices rows[:ends[frame]] and cols[:ends[frame]]
+    ends = np.searchsorted(frame_no, np.arange(len(frames)), side='right')
+    
+    for count, i in enumerate(frames):
+        # Blank the marker windows of all particles found up to this frame
+        r = rows[:ends[count]]
+        c = cols[:ends[count]]
+        inside = (r >= 0) & (r < i.shape[0]) & (c >= 0) & (c < i.shape[1])
+        i[r[inside], c[inside]] = 0
+        yield i
+
+
 def make_videos(frames, particles, save_path):
     '''Make and save mp4 videos of the movie and the developing trajectories.
 
@@ -215,71 +276,115 @@ def make_videos(frames, particles, save_path):
         
     See also
     --------
-    save_video()
+    save_video(), marked_frames()
     '''
     print("Making first video")
     writer = animation.FFMpegWriter(fps=frames.metadata['frame_rate'])  
-    fig = plt.figure()
-    
-    ims = []
-    count = 0
-    width = 2
-    dots = []
-    
-    for i in frames:
-        new_dots = particles[particles['frame'] == count].loc[:, ['x', 'y', 'frame']].to_numpy()
-    
-        for new_dot in new_dots:
-            dots.append(new_dot)
-        
-        for dot in dots:
-            ymin = int(dot[0]) - width
-            ymax = int(dot[0]) + width
-            xmin = int(dot[1]) - width
-            xmax = int(dot[1]) + width
-            i[xmin:xmax, ymin:ymax] = 0
-    
-        im = plt.imshow(i)
-        ims.append([im])
-        count += 1
-    
-    print("Saving first video")
-    save_video(fig, ims, 'trajectories.mp4', save_path, writer)
+    save_video(marked_frames(frames, particles), 'trajectories.mp4', save_path, writer)
     print("First video saved!")
     
     print("Making second video")
-    fig = plt.figure()
-    ims2 = []
-    for i in frames:
-        im = plt.imshow(i)
-        ims2.append([im])
-        count += 1
-    
-    print("Saving second video")
-    save_video(fig, ims2, 'animation.mp4', save_path, writer)
+    save_video(frames, 'animation.mp4', save_path, writer)
     print("Second video saved!")
-   
         
-def save_velocity_distribution(speed, exp_max, title, path):
-    df = pd.DataFrame({'nb' : speed})
-    df.sort_values('nb')
-    mean = sum(speed) / len(speed)
+        
+def trajectory_arrays(trajectories):
+    '''Convert the trajectories into contiguous, typed NumPy arrays.
+
+    Parameters
+    ----------
+    trajectories : Dataframe with all trajectories.
+
+    Returns
+    -------
+    arrays : Dictionary with a "frame", "x", "y", "time" and "particle" array,
+        sorted by particle and frame.
+    '''
+    frame = trajectories['frame'].to_numpy(dtype=np.int32)
+    particle = trajectories['particle'].to_numpy(dtype=np.int32)
+    order = np.lexsort((frame, particle))
     
-    fig, ax = plt.subplots()
-    ax = sns.distplot(df['nb'])
-    kdeline = ax.lines[0]
-    xs = kdeline.get_xdata()
-    ys = kdeline.get_ydata()
-    height = np.interp(mean, xs, ys)
+    arrays = {'frame': frame[order],
+              'x': trajectories['x'].to_numpy(dtype=np.float32)[order],
+              'y': trajectories['y'].to_numpy(dtype=np.float32)[order],
+              'time': trajectories['time'].to_numpy(dtype=np.float64)[order],
+              'particle': particle[order]}
+    return arrays
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _speeds_kernel(starts, ends, x, y, t, mpp, out):
+        '''Write the speeds between consecutive locations of each particle 
+        into out.'''
+        for p in numba.prange(len(starts)):
+            for i in range(starts[p] + 1, ends[p]):
+                out[i] = np.sqrt((x[i] - x[i-1])**2 + (y[i] - y[i-1])**2) * mpp / (t[i] - t[i-1])
+
+
+def get_speeds(x, y, t, starts, mpp):
+    '''Calculate the speeds between consecutive locations of the particles.
+
+    Parameters
+    ----------
+    x, y, t : Arrays with the locations and times, sorted by particle and frame.
+    starts : Array with the index of the first location of each particle.
+    mpp : Float, micron per pixel.
+
+    Returns
+    -------
+    speeds : Array with the speed at every location. The first location of a 
+        particle has no previous location, its speed is NaN.
+        
+    Notes
+    -----
+    Uses a compiled numba kernel when numba is installed, otherwise NumPy.
+    '''
+    speeds = np.full(len(x), np.nan)
+    if numba is not None:
+        ends = np.append(starts[1:], len(x))
+        _speeds_kernel(starts, ends, x, y, t, mpp, speeds)
+    else:
+        # The time step between two particles can be zero, these speeds are 
+        # overwritten with NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speeds[1:] = np.hypot(np.diff(x), np.diff(y)) * mpp / np.diff(t)
+        speeds[starts] = np.nan
+    return speeds
+
+
+def save_velocity_distribution(speed, exp_max, title, path, ax=None):
+    '''Save the velocity distribution graph at the path location. A given ax 
+    is cleared and reused, otherwise a new figure is made.'''
+    speed = np.asarray(speed)
+    mean = np.mean(speed)
+    speed_max = speed.max()
+    
+    # Histogram (Freedman-Diaconis bins, at most 50) and kernel density estimate
+    bins = min(len(np.histogram_bin_edges(speed, bins='fd')) - 1, 50)
+    density, edges = np.histogram(speed, bins=bins, density=True)
+    kde = gaussian_kde(speed)
+    xs = np.linspace(0, speed_max, 256)
+    ys = kde(xs)
+    height = kde(mean)[0]
+    
+    new_figure = ax is None
+    if new_figure:
+        fig, ax = plt.subplots()
+    else:
+        ax.cla()
+    ax.bar(edges[:-1], density, width=np.diff(edges), align='edge', alpha=0.4)
+    ax.plot(xs, ys)
     ax.set(xlabel='speed [um/s]', ylabel='probability density', title=title);
-    if max(speed) < exp_max:
+    if speed_max < exp_max:
         ax.set(xlim= (0,exp_max))
     else:
-        ax.set(xlim= (0,max(speed)))
+        ax.set(xlim= (0,speed_max))
     ax.vlines(mean, 0, height, color='steelblue', ls=':')
     ax.annotate("mean="+str("{:.2f}".format(mean)), (mean,0))
-    plt.savefig(path)
-    plt.close("all")          
+    ax.figure.savefig(path)
+    if new_figure:
+        plt.close(ax.figure)
         
     
 def get_velocity_distribution(trajectories, mpp, exp_max, save_path):
@@ -302,29 +407,28 @@ def get_velocity_distribution(trajectories, mpp, exp_max, save_path):
     --------
     save_velocity_distribution()
     '''
-    total_speed = []
-    df = pd.DataFrame()
+    series_list = []
     
-    for particle in trajectories.particle.unique():
-        locations = trajectories[trajectories["particle"] == particle].loc[:, ['frame', 'x', 'y', 'time']]
-        
-        speed = []
-        prev_frame, prev_x, prev_y, prev_t = locations.iloc[0]
-        for frame, loc in locations.iloc[1:].iterrows():
-            new_speed_f = math.sqrt((prev_x - loc['x'])**2 + (prev_y - loc['y'])**2) * mpp
-            new_speed_s = new_speed_f / ((loc['time'] - prev_t) / 1000)
-            speed.append(new_speed_s) 
-            total_speed.append(new_speed_s)
-            
-            prev_x = loc['x']
-            prev_y = loc['y']
-            prev_t = loc['time']
-
-        df = pd.concat([df,pd.DataFrame({particle:speed})], axis=1)
-        save_velocity_distribution(speed, exp_max, 'speed distribution, particle ' + str(particle), save_path + 'vd' + str(particle))
+    # Speeds between consecutive locations. The first location of a particle 
+    # has no previous location and therefore no speed.
+    arrays = trajectory_arrays(trajectories)
+    particles, starts = np.unique(arrays['particle'], return_index=True)
+    time = arrays['time'] / 1000
+    speeds = get_speeds(arrays['x'], arrays['y'], time, starts, mpp)
+    
+    # A single figure is reused for all graphs
+    fig, ax = plt.subplots()
     
-    df.to_csv(save_path + 'speed')
-    save_velocity_distribution(total_speed, exp_max, 'total speed distribution', save_path + 'vd_all')
+    for particle, speed in zip(particles, np.split(speeds, starts[1:])):
+        speed = speed[1:]
+        series_list.append(pd.Series(speed, name=particle))
+        save_velocity_distribution(speed, exp_max, 'speed distribution, particle ' + str(particle), save_path + 'vd' + str(particle), ax=ax)
+    
+    df = pd.concat(series_list, axis=1)
+    df.columns = df.columns.astype(str)
+    df.to_parquet(save_path + 'speed.parquet')
+    save_velocity_distribution(speeds[~np.isnan(speeds)], exp_max, 'total speed distribution', save_path + 'vd_all', ax=ax)
+    plt.close(fig)
     return
         
         
@@ -352,9 +456,13 @@ def plot_trajectories(trajectories, frames, particles, save_path, video=True):
     fig.set_ylim([frames.metadata['height'], 0])    
     plt.savefig(save_path + 'trajectories.png')
     
-    for particle in trajectories.particle.unique():
-        first_loc = trajectories[trajectories["particle"] == particle].head(1).loc[:, ['x', 'y']]
-        plt.text(first_loc.x, first_loc.y, particle)
+    # First location of every particle
+    firsts = (trajectories.reset_index(drop=True)
+              .sort_values('frame', kind='stable')
+              .drop_duplicates('particle', keep='first')[['particle', 'x', 'y']]
+              .to_numpy())
+    for particle, x, y in firsts:
+        plt.text(x, y, int(particle))
         
     plt.savefig(save_path + 'trajectories_numbered.png')
     
@@ -368,16 +476,18 @@ def filter_frame(trajectories, frames):
     width = frames.metadata['width']
     height = frames.metadata['height']
     
-    middle_particles = []
-    for index, particle in trajectories[trajectories["frame"] == 0].iterrows():
-        if (0.25*width < particle.x < 0.75*width) and (0.25*height < particle.y < 0.75*height):
-            middle_particles.append(int(particle.particle))
+    first = trajectories[trajectories["frame"] == 0]
+    x = first.x.to_numpy()
+    y = first.y.to_numpy()
+    middle = (0.25*width < x) & (x < 0.75*width) & (0.25*height < y) & (y < 0.75*height)
+    middle_particles = first.particle.to_numpy()[middle].astype(int)
     
     t = trajectories.loc[trajectories["particle"].isin(middle_particles)]
     
-    counts = t.frame.value_counts()
-    
-    max_frame = counts[counts == len(middle_particles)].index.max()
+    # Last frame in which all middle particles are still present. Raises a 
+    # ValueError when there are no such frames.
+    counts = np.bincount(t.frame.to_numpy().astype(np.intp))
+    max_frame = np.where(counts == len(middle_particles))[0].max()
     
     trajectories_filt = t[t.index <= max_frame]
     
@@ -402,14 +512,25 @@ def filter_ft(trajectories):
     return(trajectories_filt)
 
 
-def save_msd(im, save_path):
-    ''' Save the msd graph at the save_path location.''' 
-    fig, ax = plt.subplots()
+def save_msd(im, save_path, save_data=True, ax=None):
+    ''' Save the msd graph (and optionally the msd data as a parquet file) at 
+    the save_path location. A given ax is cleared and reused, otherwise a new 
+    figure is made.''' 
+    new_figure = ax is None
+    if new_figure:
+        fig, ax = plt.subplots()
+    else:
+        ax.cla()
     ax.plot(im.index, im, 'k-', alpha=0.1)  # black lines, semitransparent
     ax.set(ylabel=r'$\langle \Delta r^2 \rangle$ [$um^2$]',
            xlabel='lag time $t$ [$s$]')
-    im.to_csv(save_path)
-    plt.savefig(save_path + '.png')
+    if save_data:
+        table = pd.DataFrame(im)
+        table.columns = table.columns.astype(str)
+        table.to_parquet(save_path + '.parquet')
+    ax.figure.savefig(save_path + '.png')
+    if new_figure:
+        plt.close(ax.figure)
     
     
 def get_msd(trajectories, frames, save_path, max_lagtime=10, EMSD="mean"):
@@ -445,21 +566,24 @@ def get_msd(trajectories, frames, save_path, max_lagtime=10, EMSD="mean"):
     fps = frames.metadata['frame_rate']             # frames/second
     mpp = frames.metadata['calibration_um']         # micron/pixel
     
+    # A single figure is reused for all graphs
+    fig, ax = plt.subplots()
+    
     im1 = tp.imsd(trajectories, mpp, fps, max_lagtime=int(max_lagtime*fps)).dropna(axis=1)  
-    save_msd(im1, save_path + "MSD")
+    save_msd(im1, save_path + "MSD", ax=ax)
     
     if EMSD=="mean":
-        save_msd(im1.dropna(axis=1).mean(axis=1), save_path + "MSD_mean")
+        save_msd(im1.dropna(axis=1).mean(axis=1), save_path + "MSD_mean", ax=ax)
         
     elif EMSD=="emsd":
         im2 = tp.emsd(trajectories, mpp, fps)
-        save_msd(im2, save_path + "MSD_ensamble")    
+        save_msd(im2, save_path + "MSD_ensamble", ax=ax)    
         
     elif EMSD=="ft":
         try:
             t_filt = filter_ft(trajectories)
             im3 = tp.imsd(t_filt, mpp, fps).dropna(axis=1)  
-            save_msd(im3, save_path + "MSD_full_traj")
+            save_msd(im3, save_path + "MSD_full_traj", ax=ax)
         except ValueError:
             print("No unbroken trajectories")
             
@@ -467,12 +591,14 @@ def get_msd(trajectories, frames, save_path, max_lagtime=10, EMSD="mean"):
         try:
             t_filt = filter_frame(trajectories, frames)
             im4 = tp.emsd(t_filt, mpp, fps)
-            save_msd(im4, save_path + "MSD_Frame")
+            save_msd(im4, save_path + "MSD_Frame", ax=ax)
         except ValueError:
             print("No particles near the center")
             
     else:
         print("Mean square displacement filter not correctly defined.")
+    
+    plt.close(fig)
         
         
 def remove_trajectories(trajectories, remove, file_path):
@@ -491,16 +617,14 @@ def remove_trajectories(trajectories, remove, file_path):
     remove.sort()
     pd.DataFrame(remove).to_csv(file_path['save'] + "removed")
     
-    for p in remove:
-        trajectories = trajectories[trajectories.particle != p]
+    trajectories = trajectories.loc[~trajectories['particle'].isin(remove)]
     return(trajectories)
 
 
-def combine_csv(get_paths, file):
-    '''Combine dataframes for the combine() function.'''
-    df = pd.DataFrame()
-    for path in get_paths:
-        df = pd.concat([df,pd.read_csv(path + file, index_col=0)], axis=1) 
+def combine_parquet(get_paths, file):
+    '''Combine the parquet files of all samples for the combine() function.'''
+    dfs = [pd.read_parquet(path + file + '.parquet') for path in get_paths]
+    df = pd.concat(dfs, axis=1)
     return df
 
 
@@ -516,24 +640,25 @@ def combine(paths, save_dir, filenames, exp_max):
     
     See also
     --------
-    create_folder(), combine_csv(), save_velocity_distribution() 
+    create_folder(), combine_parquet(), save_velocity_distribution() 
     and save_msd()
     '''
     total_path = save_dir + filenames + '_Total'
     create_folder(total_path)    
     
+    # A single figure is reused for all graphs
+    fig, ax = plt.subplots()
+    
     # total speed distribution
-    all_speed_df = combine_csv(paths['save'].tolist(), "speed")
-    all_speed_df.to_csv(total_path + '\\speed')
-    all_speed = []
-    for x in all_speed_df.values.tolist():
-        for y in x:
-            if str(y) != 'nan':
-                all_speed.append(y)
-    save_velocity_distribution(all_speed, exp_max, 'total speed distribution', total_path + '\\vd_all')
+    all_speed_df = combine_parquet(paths['save'].tolist(), "speed")
+    all_speed_df.to_csv(os.path.join(total_path, 'speed'))
+    all_speed = all_speed_df.to_numpy(dtype=np.float64).ravel()
+    all_speed = all_speed[~np.isnan(all_speed)]
+    save_velocity_distribution(all_speed, exp_max, 'total speed distribution', os.path.join(total_path, 'vd_all'), ax=ax)
     
     # total msd
-    all_msd =  combine_csv(paths['save'].tolist(), "msd")
-    all_msd.to_csv(total_path + '\\msd')
-    save_msd(all_msd, total_path + '\\msd')
-    save_msd(all_msd.dropna(axis=1).mean(axis=1), total_path + "\\MSD_mean")
+    all_msd = combine_parquet(paths['save'].tolist(), "MSD")
+    all_msd.to_csv(os.path.join(total_path, 'msd'))
+    save_msd(all_msd, os.path.join(total_path, 'msd'), save_data=False, ax=ax)
+    save_msd(all_msd.dropna(axis=1).mean(axis=1), os.path.join(total_path, 'MSD_mean'), ax=ax)
+    plt.close(fig)